@@ -1,14 +1,18 @@
 """GSC - Gearfall Stock Exchange - Discord economy bot for Minecraft server."""
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 import asyncio
 import sys
+import time
+from collections import Counter
+from typing import Dict
 import config
 import database
 import market
 import team_detection
 import market_simulator
 import market_updates
+import graphing
 from logger import logger
 
 
@@ -41,6 +45,12 @@ class EconomyBot(commands.Bot):
             'achievements',
             'commands_candlestick'
         ]
+        
+        # user_id -> monotonic time of last influencing message, checked before the DB
+        self._cooldown_cache: Dict[int, float] = {}
+        
+        # team symbol -> messages not yet applied to market activity (flushed every second)
+        self._activity_pending: Counter = Counter()
     
     async def setup_hook(self):
         """Initialize database, market data, and load commands."""
@@ -56,14 +66,17 @@ class EconomyBot(commands.Bot):
         self.add_view(LiveGraphView())
         logger.info("Registered persistent views")
         
-        # Load cogs
+        # Load cogs concurrently
         logger.info("Loading commands...")
-        for ext in self.initial_extensions:
-            try:
-                await self.load_extension(ext)
+        results = await asyncio.gather(
+            *(self.load_extension(ext) for ext in self.initial_extensions),
+            return_exceptions=True
+        )
+        for ext, result in zip(self.initial_extensions, results):
+            if isinstance(result, Exception):
+                logger.error(f"  Failed to load {ext}: {result}")
+            else:
                 logger.info(f"  Loaded: {ext}")
-            except Exception as e:
-                logger.error(f"  Failed to load {ext}: {e}")
         
         # Sync commands to guild
         logger.info("Syncing commands...")
@@ -120,6 +133,55 @@ class EconomyBot(commands.Bot):
         
         self.loop.create_task(alert_loop())
         logger.info("Price alerts checker started!")
+        
+        if not self.prune_cooldown_cache.is_running():
+            self.prune_cooldown_cache.start()
+        
+        if not self.flush_activity.is_running():
+            self.flush_activity.start()
+    
+    async def on_guild_available(self, guild: discord.Guild):
+        """Resolve team role IDs whenever a guild's data is (re)loaded."""
+        team_detection.register_guild_roles(guild)
+    
+    async def on_guild_join(self, guild: discord.Guild):
+        """Resolve team role IDs for a newly joined guild."""
+        team_detection.register_guild_roles(guild)
+    
+    async def on_guild_role_create(self, role: discord.Role):
+        """Track newly created team roles."""
+        team_detection.update_role(role)
+    
+    async def on_guild_role_update(self, before: discord.Role, after: discord.Role):
+        """Track renamed team roles."""
+        team_detection.update_role(after)
+    
+    async def on_guild_role_delete(self, role: discord.Role):
+        """Forget deleted team roles."""
+        team_detection.remove_role(role)
+    
+    @tasks.loop(seconds=1)
+    async def flush_activity(self):
+        """Apply batched message activity to the market."""
+        self._flush_pending_activity()
+    
+    def _flush_pending_activity(self):
+        """Swap out the pending counter and apply each team's count in one call."""
+        if not self._activity_pending:
+            return
+        
+        pending, self._activity_pending = self._activity_pending, Counter()
+        for symbol, count in pending.items():
+            market.market.increment_activity(symbol, count)
+    
+    @tasks.loop(seconds=config.MESSAGE_COOLDOWN)
+    async def prune_cooldown_cache(self):
+        """Drop cooldown cache entries that have already expired."""
+        cutoff = time.monotonic() - config.MESSAGE_COOLDOWN
+        self._cooldown_cache = {
+            user_id: last for user_id, last in self._cooldown_cache.items()
+            if last > cutoff
+        }
     
     async def on_message(self, message: discord.Message):
         """Process messages for team activity scoring."""
@@ -127,22 +189,39 @@ class EconomyBot(commands.Bot):
         if not message.guild:
             return
         
-        # Process commands first
-        await self.process_commands(message)
+        # Never count our own messages
+        if message.author == self.user:
+            return
+        
+        # Other bots (e.g. chat bridges) can only count via a [TAG], since roles are skipped for bots
+        if message.author.bot and '[' not in message.content:
+            return
+        
+        # Commands don't count towards activity
+        if message.content.startswith(self.command_prefix):
+            await self.process_commands(message)
+            return
         
-        # Check message cooldown
+        # Check message cooldown (in-memory first, DB only on cache miss/expiry)
         user_id = message.author.id
+        now = time.monotonic()
+        last = self._cooldown_cache.get(user_id)
+        if last is not None and now - last < config.MESSAGE_COOLDOWN:
+            return
+        
         can_influence = await database.check_message_cooldown(user_id, config.MESSAGE_COOLDOWN)
         
         if not can_influence:
             return
         
+        self._cooldown_cache[user_id] = now
+        
         # Detect team from message
         team_symbol = team_detection.detect_team_from_message(message)
         
         if team_symbol:
-            # Increment activity score for the team
-            market.market.increment_activity(team_symbol)
+            # Queue activity for the team (applied in batches by flush_activity)
+            self._activity_pending[team_symbol] += 1
             
             # Optional: Log for debugging
             # print(f"Message from {message.author} attributed to {team_symbol}")
@@ -151,11 +230,31 @@ class EconomyBot(commands.Bot):
         """Cleanup when bot is shutting down."""
         logger.info("Shutting down...")
         market_simulator.simulator.stop()
+        await market.market.close()
+        self.prune_cooldown_cache.cancel()
+        self.flush_activity.cancel()
+        self._flush_pending_activity()
         if hasattr(self, 'broadcaster') and self.broadcaster:
             self.broadcaster.stop()
+        graphing.shutdown_graph_pool()
         await super().close()
 
 
+def _get_loop_factory():
+    """Use uvloop's faster event loop when it is installed (not available on Windows)."""
+    try:
+        import uvloop
+    except ImportError:
+        return None
+    return uvloop.new_event_loop
+
+
+async def _run_bot(bot: EconomyBot):
+    """Start the bot and close it cleanly when the loop stops."""
+    async with bot:
+        await bot.start(config.DISCORD_TOKEN)
+
+
 def main():
     """Main entry point."""
     # Check configuration
@@ -172,11 +271,17 @@ def main():
         logger.warning("ADMIN_ROLE_ID not set in .env file.")
         logger.warning("Admin commands will not work until this is configured.")
     
-    # Create and run bot
+    # Create and run bot (same as bot.run, but on uvloop when available)
     bot = EconomyBot()
+    loop_factory = _get_loop_factory()
+    if loop_factory:
+        logger.info("Using uvloop event loop")
+    
+    discord.utils.setup_logging()
     
     try:
-        bot.run(config.DISCORD_TOKEN)
+        with asyncio.Runner(loop_factory=loop_factory) as runner:
+            runner.run(_run_bot(bot))
     except KeyboardInterrupt:
         logger.info("\nReceived interrupt signal, shutting down...")
     except Exception as e:
@@ -5,7 +5,7 @@ matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 from matplotlib.patches import Rectangle
-from datetime import datetime, timedelta
+from datetime import datetime, timezone
 import market
 import team_detection
 import utils
@@ -26,24 +26,23 @@ async def generate_candlestick_chart(symbol: str, hours: int = 24) -> str:
     """
     os.makedirs(config.GRAPH_DIR, exist_ok=True)
     
-    # Get OHLC data (aggregated from price history)
-    stock_info = await market.market.get_stock_info(symbol)
-    if not stock_info:
+    # Get OHLC data (aggregated from pre-parsed price history)
+    price_series = await market.market.get_price_series(symbol)
+    if price_series is None:
         raise ValueError(f"Stock {symbol} not found")
     
-    history = stock_info['price_history']
-    if not history:
+    if not price_series['timestamps']:
         raise ValueError(f"No price history for {symbol}")
     
     # Aggregate into hourly OHLC candles
-    candles = _aggregate_to_ohlc(history, interval_minutes=60)
+    candles = _aggregate_to_ohlc(price_series['timestamps'], price_series['prices'], interval_minutes=60)
     
     if not candles:
         raise ValueError(f"Insufficient data for candlestick chart")
     
     # Limit to specified hours
-    cutoff = datetime.now() - timedelta(hours=hours)
-    candles = [c for c in candles if c['time'] >= cutoff]
+    cutoff = datetime.now(timezone.utc).timestamp() - hours * 3600
+    candles = [c for c in candles if c['start'] >= cutoff]
     
     if len(candles) < 2:
         raise ValueError(f"Insufficient recent data (need at least 2 candles)")
@@ -136,47 +135,37 @@ async def generate_candlestick_chart(symbol: str, hours: int = 24) -> str:
     return output_path
 
 
-def _aggregate_to_ohlc(history, interval_minutes=60):
-    """Aggregate price history into OHLC candles."""
-    if not history:
+def _aggregate_to_ohlc(timestamps, prices, interval_minutes=60):
+    """Aggregate parallel epoch-second timestamp/price lists into OHLC candles."""
+    if not timestamps:
         return []
     
+    interval_seconds = interval_minutes * 60
     candles = []
     current_candle = None
     
-    for entry in history:
-        try:
-            timestamp = datetime.fromisoformat(entry['timestamp'])
-            price = entry['price']
-            
-            # Round timestamp to interval
-            interval_start = timestamp.replace(
-                minute=(timestamp.minute // interval_minutes) * interval_minutes,
-                second=0,
-                microsecond=0
-            )
-            
-            if current_candle is None or current_candle['time'] != interval_start:
-                # Start new candle
-                if current_candle is not None:
-                    candles.append(current_candle)
-                
-                current_candle = {
-                    'time': interval_start,
-                    'open': price,
-                    'high': price,
-                    'low': price,
-                    'close': price
-                }
-            else:
-                # Update current candle
-                current_candle['high'] = max(current_candle['high'], price)
-                current_candle['low'] = min(current_candle['low'], price)
-                current_candle['close'] = price
+    for timestamp, price in zip(timestamps, prices):
+        # Round timestamp down to the interval
+        interval_start = timestamp - timestamp % interval_seconds
         
-        except (ValueError, KeyError) as e:
-            logger.warning(f"Invalid entry in history: {e}")
-            continue
+        if current_candle is None or current_candle['start'] != interval_start:
+            # Start new candle
+            if current_candle is not None:
+                candles.append(current_candle)
+            
+            current_candle = {
+                'start': interval_start,
+                'time': datetime.fromtimestamp(interval_start, timezone.utc),
+                'open': price,
+                'high': price,
+                'low': price,
+                'close': price
+            }
+        else:
+            # Update current candle
+            current_candle['high'] = max(current_candle['high'], price)
+            current_candle['low'] = min(current_candle['low'], price)
+            current_candle['close'] = price
     
     # Add last candle
     if current_candle is not None:
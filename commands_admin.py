@@ -1,4 +1,5 @@
 """Admin commands for the economy bot."""
+import io
 import discord
 from discord import app_commands
 from discord.ext import commands
@@ -20,8 +21,7 @@ class AdminCommands(commands.Cog):
         if not isinstance(interaction.user, discord.Member):
             return False
         
-        admin_role = discord.utils.get(interaction.user.roles, id=config.ADMIN_ROLE_ID)
-        return admin_role is not None
+        return interaction.user.get_role(config.ADMIN_ROLE_ID) is not None
     
     @app_commands.command(name="give", description="[Admin] Give Cogs to a user")
     @app_commands.describe(
@@ -203,6 +203,35 @@ class AdminCommands(commands.Cog):
             ephemeral=True
         )
     
+    @app_commands.command(name="exportstock", description="[Admin] Export a stock's data as JSON")
+    @app_commands.describe(symbol="Stock symbol (e.g., STMP, VOC)")
+    @app_commands.check(is_admin)
+    async def exportstock(self, interaction: discord.Interaction, symbol: str):
+        """Send a stock's current data (including price history) as a JSON file."""
+        symbol = team_detection.normalize_symbol(symbol)
+        
+        # Validate symbol
+        if not team_detection.validate_symbol(symbol):
+            await interaction.response.send_message(
+                f"❌ Invalid stock symbol: **{symbol}**",
+                ephemeral=True
+            )
+            return
+        
+        content = await market.market.export_json(symbol)
+        if content is None:
+            await interaction.response.send_message(
+                f"❌ No market data for **{symbol}**",
+                ephemeral=True
+            )
+            return
+        
+        await interaction.response.send_message(
+            f"📄 Current data for **{symbol}** (timestamps are Unix epoch seconds)",
+            file=discord.File(io.BytesIO(content), filename=f"{symbol}.json"),
+            ephemeral=True
+        )
+    
     @app_commands.command(name="ratebuild", description="[Admin] Rate a team's build out of 10")
     @app_commands.describe(
         symbol="Team symbol (e.g., STMP, VOC)",
@@ -442,6 +471,7 @@ class AdminCommands(commands.Cog):
     @take.error
     @setprice.error
     @resetmarket.error
+    @exportstock.error
     @ratebuild.error
     @heat.error
     @marketupdate.error
@@ -25,7 +25,7 @@ class GraphCommands(commands.Cog):
         symbol = team_detection.normalize_symbol(symbol)
         
         # Validate symbol
-        if not team_detection.validate_symbol(symbol):
+        if symbol not in team_detection.VALID_SYMBOLS:
             await interaction.followup.send(
                 f"❌ Invalid stock symbol: **{symbol}**",
                 ephemeral=True
@@ -34,11 +34,11 @@ class GraphCommands(commands.Cog):
         
         try:
             # Generate graph
-            graph_path = await graphing.generate_price_graph(symbol)
+            graph_image = await graphing.generate_price_graph(symbol)
             
             # Send graph
             team_name = team_detection.get_team_name(symbol)
-            file = discord.File(graph_path, filename=f'{symbol}_graph.png')
+            file = discord.File(graph_image, filename=f'{symbol}_graph.png')
             
             description = "Price history"
             if live:
@@ -100,7 +100,7 @@ class GraphCommands(commands.Cog):
         normalized_symbols = []
         for symbol in symbols:
             symbol = team_detection.normalize_symbol(symbol)
-            if not team_detection.validate_symbol(symbol):
+            if symbol not in team_detection.VALID_SYMBOLS:
                 await interaction.followup.send(
                     f"❌ Invalid stock symbol: **{symbol}**",
                     ephemeral=True
@@ -110,10 +110,10 @@ class GraphCommands(commands.Cog):
         
         try:
             # Generate comparison graph
-            graph_path = await graphing.generate_comparison_graph(normalized_symbols)
+            graph_image = await graphing.generate_comparison_graph(normalized_symbols)
             
             # Send graph
-            file = discord.File(graph_path, filename='comparison_graph.png')
+            file = discord.File(graph_image, filename='comparison_graph.png')
             
             embed = discord.Embed(
                 title="📊 Stock Comparison",
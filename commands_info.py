@@ -7,12 +7,27 @@ import team_detection
 import utils
 import config
 
+# Precomputed activity bars (index = number of filled segments)
+_BAR_LENGTH = 20
+_BARS = ["█" * i + "░" * (_BAR_LENGTH - i) for i in range(_BAR_LENGTH + 1)]
+
+# Activity level tiers: (score must exceed threshold, label)
+_ACTIVITY_LEVELS = [
+    (50, "🔥 Very High"),
+    (20, "📈 High"),
+    (5, "📊 Moderate"),
+    (float('-inf'), "📉 Low"),
+]
+
 
 class InfoCommands(commands.Cog):
     """Information and statistics commands."""
     
     def __init__(self, bot):
         self.bot = bot
+        # The help embed is static, so build both variants once
+        self._help_embed = self._build_help_embed(include_admin=False)
+        self._admin_help_embed = self._build_help_embed(include_admin=True)
     
     @app_commands.command(name="activity", description="View team activity levels affecting market prices")
     async def activity(self, interaction: discord.Interaction):
@@ -23,34 +38,26 @@ class InfoCommands(commands.Cog):
             color=0x57F287
         )
         
-        # Get all activity scores
-        activity_data = []
-        for symbol in config.TEAMS.keys():
-            score = market.market.get_activity_score(symbol)
-            team_name = team_detection.get_team_name(symbol)
-            activity_data.append((symbol, team_name, score))
+        # Get all activity scores in one call
+        scores = market.market.get_all_activity_scores()
+        activity_data = [
+            (symbol, team_detection.get_team_name(symbol), scores.get(symbol, 0))
+            for symbol in config.TEAMS
+        ]
         
         # Sort by activity
         activity_data.sort(key=lambda x: x[2], reverse=True)
         
         # Create activity bars
-        max_score = max(score for _, _, score in activity_data) if activity_data else 1
+        max_score = max(scores.values(), default=1)
         
         for symbol, team_name, score in activity_data:
             # Create visual bar
-            bar_length = 20
-            filled = int((score / max_score * bar_length)) if max_score > 0 else 0
-            bar = "█" * filled + "░" * (bar_length - filled)
+            filled = int((score / max_score * _BAR_LENGTH)) if max_score > 0 else 0
+            bar = _BARS[min(filled, _BAR_LENGTH)]
             
             # Activity level
-            if score > 50:
-                level = "🔥 Very High"
-            elif score > 20:
-                level = "📈 High"
-            elif score > 5:
-                level = "📊 Moderate"
-            else:
-                level = "📉 Low"
+            level = next(label for threshold, label in _ACTIVITY_LEVELS if score > threshold)
             
             embed.add_field(
                 name=f"{symbol} - {team_name}",
@@ -76,6 +83,17 @@ class InfoCommands(commands.Cog):
     @app_commands.command(name="help", description="View bot commands and features")
     async def help_command(self, interaction: discord.Interaction):
         """Display help information."""
+        embed = self._help_embed
+        
+        # Admin commands (only show to admins)
+        if isinstance(interaction.user, discord.Member) and interaction.user.get_role(config.ADMIN_ROLE_ID):
+            embed = self._admin_help_embed
+        
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+    
+    @staticmethod
+    def _build_help_embed(include_admin: bool) -> discord.Embed:
+        """Build the help embed, optionally including admin commands."""
         embed = discord.Embed(
             title="📚 GSC - Gearfall Stock Exchange",
             description="Trade team stocks and build your fortune!\n━━━━━━━━━━━━━━━━━━━━",
@@ -123,33 +141,32 @@ class InfoCommands(commands.Cog):
         )
         
         # Available Stocks
-        stocks = ", ".join([f"{s}" for s in config.TEAMS.keys()])
+        stocks = ", ".join(config.TEAMS.keys())
         embed.add_field(
             name="🏢 Available Stocks",
             value=stocks,
             inline=False
         )
         
-        # Admin commands (only show to admins)
-        if isinstance(interaction.user, discord.Member):
-            admin_role = discord.utils.get(interaction.user.roles, id=config.ADMIN_ROLE_ID)
-            if admin_role:
-                embed.add_field(
-                    name="🛡️ Admin Commands",
-                    value=(
-                        "`/give <user> <cogs>` - Give Cogs to player\n"
-                        "`/take <user> <cogs>` - Take Cogs from player\n"
-                        "`/setprice <symbol> <price>` - Set stock price\n"
-                        "`/resetmarket` - Reset all prices\n"
-                        "`/ratebuild <symbol> <rating>` - Rate team build (1-10)\n"
-                        "`/heat <symbol>` - Apply HEAT buff (+25%)"
-                    ),
-                    inline=False
-                )
+        # Admin commands (only shown to admins)
+        if include_admin:
+            embed.add_field(
+                name="🛡️ Admin Commands",
+                value=(
+                    "`/give <user> <cogs>` - Give Cogs to player\n"
+                    "`/take <user> <cogs>` - Take Cogs from player\n"
+                    "`/setprice <symbol> <price>` - Set stock price\n"
+                    "`/resetmarket` - Reset all prices\n"
+                    "`/exportstock <symbol>` - Export stock data as JSON\n"
+                    "`/ratebuild <symbol> <rating>` - Rate team build (1-10)\n"
+                    "`/heat <symbol>` - Apply HEAT buff (+25%)"
+                ),
+                inline=False
+            )
         
         embed.set_footer(text="Use /stock <symbol> for interactive trading with buttons!")
         
-        await interaction.response.send_message(embed=embed, ephemeral=True)
+        return embed
 
 
 async def setup(bot):
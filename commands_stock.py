@@ -345,8 +345,8 @@ async def create_stock_embed(symbol: str, user_id: int):
     # Generate mini price graph
     graph_file = None
     try:
-        graph_path = await graphing.generate_price_graph(symbol)
-        graph_file = discord.File(graph_path, filename=f'{symbol}_chart.png')
+        graph_image = await graphing.generate_price_graph(symbol)
+        graph_file = discord.File(graph_image, filename=f'{symbol}_chart.png')
         embed.set_image(url=f'attachment://{symbol}_chart.png')
     except Exception as e:
         # Log error but continue without graph
@@ -375,9 +375,9 @@ async def create_stock_embed(symbol: str, user_id: int):
     embed.add_field(name="📊 Volatility", value=f"{volatility * 100:.1f}%", inline=True)
     
     # Price history stats
-    history = stock_info.get('price_history', [])
+    history = await market.market.get_price_history(symbol, limit=10)
     if len(history) >= 2:
-        recent_prices = [h['price'] for h in history[-10:]]
+        recent_prices = [h['price'] for h in history]
         if recent_prices:
             high_24h = max(recent_prices)
             low_24h = min(recent_prices)
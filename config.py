@@ -111,6 +111,8 @@ DB_PATH = 'data/economy.db'
 
 # Market Data Configuration
 MARKET_DATA_DIR = 'data/stocks'
+MARKET_FLUSH_INTERVAL = 5  # Seconds between writes of changed stock files
+MARKET_FLUSH_UPDATES = 100  # Flush early after this many logged price updates
 
 # Graph Configuration
 GRAPH_DIR = 'data/graphs'
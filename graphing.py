@@ -1,11 +1,17 @@
 """Graphing module for price history visualization."""
+import io
 import os
+import asyncio
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import matplotlib
 matplotlib.use('Agg')  # Use non-GUI backend
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 from datetime import datetime
-from typing import List, Dict
+from typing import List, Dict, Optional
 import market
 import team_detection
 import utils
@@ -15,13 +21,135 @@ from logger import logger
 # Set dark theme
 plt.style.use('dark_background')
 
+# Process pool for rendering graphs off the event loop (created on first use)
+_GRAPH_POOL: Optional[ProcessPoolExecutor] = None
 
-def _ensure_graph_dir():
-    """Ensure graph directory exists."""
-    os.makedirs(config.GRAPH_DIR, exist_ok=True)
+# LRU cache of rendered graphs: (symbol, history length, last timestamp) -> PNG bytes
+_GRAPH_CACHE: OrderedDict = OrderedDict()
+_GRAPH_CACHE_MAX = 64
 
+# Figure/axes pairs reused across renders within a worker process: kind -> (fig, ax)
+_FIGURES: Dict[str, tuple] = {}
 
-async def generate_price_graph(symbol: str, days: int = 7) -> str:
+# Fixed subplot margins per graph kind (avoids tight_layout/bbox_inches='tight' on every save)
+_FIGURE_MARGINS = {
+    'price': dict(left=0.02, right=0.95, top=0.90, bottom=0.10),
+    'comparison': dict(left=0.07, right=0.98, top=0.93, bottom=0.21),
+    'portfolio': dict(left=0.07, right=0.98, top=0.93, bottom=0.21),
+}
+
+# PNG zlib level: Discord re-encodes attachments anyway, so favour speed over size
+_PNG_COMPRESS_LEVEL = 1
+
+# Longer histories are downsampled to about this many points (a chart is ~1200px wide)
+_MAX_PLOT_POINTS = 1000
+_RECENT_POINTS = 20  # Most recent points are always kept as-is (used for high/low markers)
+
+_SECONDS_PER_DAY = 86400.0
+
+
+def _get_graph_pool() -> ProcessPoolExecutor:
+    """Get the graph rendering process pool, creating it if needed."""
+    global _GRAPH_POOL
+    if _GRAPH_POOL is None:
+        # Never fork: the bot already runs threads (aiosqlite, asyncio.to_thread) that a
+        # forked child would inherit mid-lock. forkserver where supported, else spawn.
+        start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        _GRAPH_POOL = ProcessPoolExecutor(
+            max_workers=os.cpu_count(),
+            mp_context=multiprocessing.get_context(start_method)
+        )
+    return _GRAPH_POOL
+
+
+def shutdown_graph_pool():
+    """Shut down the graph rendering process pool."""
+    global _GRAPH_POOL
+    if _GRAPH_POOL is not None:
+        _GRAPH_POOL.shutdown(wait=False, cancel_futures=True)
+        _GRAPH_POOL = None
+
+
+def _get_cached_graph(key: tuple) -> Optional[bytes]:
+    """Return the cached PNG bytes for a key, if any."""
+    png = _GRAPH_CACHE.get(key)
+    if png is None:
+        return None
+    
+    _GRAPH_CACHE.move_to_end(key)
+    return png
+
+
+def _cache_graph(key: tuple, png: bytes):
+    """Store rendered PNG bytes, evicting the least recently used entry."""
+    _GRAPH_CACHE[key] = png
+    _GRAPH_CACHE.move_to_end(key)
+    if len(_GRAPH_CACHE) > _GRAPH_CACHE_MAX:
+        _GRAPH_CACHE.popitem(last=False)
+
+
+def _get_figure(kind: str):
+    """
+    Get a cleared figure and axes for a graph kind, creating them once per process.
+    
+    Only called from render functions, so each pool worker owns its own figures.
+    """
+    if kind not in _FIGURES:
+        fig, ax = plt.subplots(figsize=(config.GRAPH_WIDTH, config.GRAPH_HEIGHT), dpi=config.GRAPH_DPI)
+        fig.subplots_adjust(**_FIGURE_MARGINS[kind])
+        _FIGURES[kind] = (fig, ax)
+    
+    fig, ax = _FIGURES[kind]
+    ax.clear()
+    plt.figure(fig.number)  # Make current so pyplot helpers target this figure
+    return fig, ax
+
+
+def _to_plot_dates(timestamps: List[float]) -> np.ndarray:
+    """Convert epoch seconds to Matplotlib date numbers (days since the 1970 epoch)."""
+    return np.asarray(timestamps, dtype=np.float64) / _SECONDS_PER_DAY
+
+
+def _downsample(timestamps: np.ndarray, prices: np.ndarray):
+    """
+    Reduce a long price series to roughly _MAX_PLOT_POINTS points before plotting.
+    
+    Older points are split into buckets and only each bucket's min and max are kept,
+    so peaks and the overall high/low survive. The first point and the most recent
+    _RECENT_POINTS points are always kept.
+    """
+    n = len(prices)
+    if n <= _MAX_PLOT_POINTS:
+        return timestamps, prices
+    
+    head_n = n - _RECENT_POINTS
+    buckets = (_MAX_PLOT_POINTS - _RECENT_POINTS) // 2
+    bucket_size = -(-head_n // buckets)  # Ceiling division
+    
+    # Pad with the last value so the head reshapes into equal buckets
+    head = np.pad(prices[:head_n], (0, bucket_size * buckets - head_n), mode='edge').reshape(buckets, bucket_size)
+    offsets = np.arange(buckets) * bucket_size
+    head_idx = np.concatenate(([0], offsets + head.argmin(axis=1), offsets + head.argmax(axis=1)))
+    head_idx = np.unique(np.minimum(head_idx, head_n - 1))  # Sorted, duplicates removed
+    
+    idx = np.concatenate((head_idx, np.arange(head_n, n)))
+    return timestamps[idx], prices[idx]
+
+
+def _save_png(fig) -> bytes:
+    """Encode a figure as PNG bytes in memory."""
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png', dpi=config.GRAPH_DPI, pil_kwargs={'compress_level': _PNG_COMPRESS_LEVEL})
+    return buf.getvalue()
+
+
+async def _render_in_pool(render_func, *args) -> bytes:
+    """Run a render function in the process pool without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_graph_pool(), render_func, *args)
+
+
+async def generate_price_graph(symbol: str, days: int = 7) -> io.BytesIO:
     """
     Generate a price history graph for a stock.
     
@@ -30,43 +158,50 @@ async def generate_price_graph(symbol: str, days: int = 7) -> str:
         days: Number of days to show (not used for now, shows all history)
     
     Returns:
-        Path to the generated graph image
+        In-memory PNG image, ready to pass to discord.File
     """
-    _ensure_graph_dir()
-    
-    # Get stock info
-    stock_info = await market.market.get_stock_info(symbol)
-    if not stock_info:
+    # Reuse the last render if no new price tick has arrived (checked before copying the history)
+    series_key = await market.market.get_price_series_key(symbol)
+    if series_key is None:
         raise ValueError(f"Stock {symbol} not found")
     
-    # Get price history
-    history = stock_info['price_history']
-    if not history:
+    if not series_key[0]:
         raise ValueError(f"No price history for {symbol}")
     
+    cached_png = _get_cached_graph((symbol,) + series_key)
+    if cached_png:
+        return io.BytesIO(cached_png)
+    
+    # Get price history as timestamp/price columns
+    price_series = await market.market.get_price_series(symbol)
+    if price_series is None:
+        raise ValueError(f"Stock {symbol} not found")
+    cache_key = (symbol,) + price_series['key']
+    
     # Prepare data
-    timestamps = []
-    prices = []
+    timestamps = _to_plot_dates(price_series['timestamps'])
+    prices = np.asarray(price_series['prices'], dtype=np.float64) / config.SPURS_PER_COG  # Convert to Cogs for display
     
-    for entry in history:
-        try:
-            timestamp = datetime.fromisoformat(entry['timestamp'])
-            price = entry['price'] / config.SPURS_PER_COG  # Convert to Cogs for display
-            timestamps.append(timestamp)
-            prices.append(price)
-        except (ValueError, KeyError) as e:
-            logger.warning(f"Invalid price history entry for {symbol}: {e}")
-            continue
+    # Downsample long histories so less data is pickled and plotted
+    timestamps, prices = _downsample(timestamps, prices)
     
-    if not timestamps:
-        raise ValueError(f"No valid price history for {symbol}")
+    team_name = team_detection.get_team_name(symbol)
     
-    # Create figure with professional stock chart styling
-    fig = plt.figure(figsize=(config.GRAPH_WIDTH, config.GRAPH_HEIGHT), dpi=config.GRAPH_DPI)
+    # Render in a worker process so the event loop stays responsive
+    png = await _render_in_pool(_render_price_graph, symbol, timestamps, prices, team_name)
+    _cache_graph(cache_key, png)
+    
+    return io.BytesIO(png)
+
+
+def _render_price_graph(symbol: str, timestamps: np.ndarray, prices: np.ndarray,
+                        team_name: Optional[str]) -> bytes:
+    """Render a price history graph to PNG bytes (runs in the graph process pool)."""
+    # Reuse this worker's figure with professional stock chart styling
+    fig, ax = _get_figure('price')
     fig.patch.set_facecolor('#0B0E11')
     
     # Main chart
-    ax = fig.add_subplot(111)
     ax.set_facecolor('#131722')
     
     # Determine color (green if up, red if down)
@@ -79,19 +214,24 @@ async def generate_price_graph(symbol: str, days: int = 7) -> str:
     # Add area fill with gradient effect
     ax.fill_between(timestamps, prices, alpha=0.2, color=line_color, zorder=1)
     
-    # Add high/low markers for recent peaks
+    # Add high/low markers for recent peaks (last 20 points)
     if len(prices) > 5:
-        high_idx = prices.index(max(prices[-20:] if len(prices) > 20 else prices))
-        low_idx = prices.index(min(prices[-20:] if len(prices) > 20 else prices))
-        ax.plot(timestamps[high_idx], prices[high_idx], 'o', color='#26A69A', markersize=6, zorder=6)
-        ax.plot(timestamps[low_idx], prices[low_idx], 'o', color='#EF5350', markersize=6, zorder=6)
+        recent_start = max(0, len(prices) - _RECENT_POINTS)
+        recent = prices[recent_start:]
+        high_idx = recent_start + int(recent.argmax())
+        low_idx = recent_start + int(recent.argmin())
+        # One scatter artist for both markers instead of two Line2D objects
+        ax.scatter(
+            [timestamps[high_idx], timestamps[low_idx]],
+            [prices[high_idx], prices[low_idx]],
+            c=['#26A69A', '#EF5350'], s=36, zorder=6
+        )
     
     # Calculate statistics
-    team_name = team_detection.get_team_name(symbol)
     current_price = prices[-1]
     open_price = prices[0]
-    high_price = max(prices)
-    low_price = min(prices)
+    high_price = prices.max()
+    low_price = prices.min()
     price_change = current_price - open_price
     price_change_pct = (price_change / open_price * 100) if open_price != 0 else 0
     
@@ -137,18 +277,11 @@ async def generate_price_graph(symbol: str, days: int = 7) -> str:
     # Set margins for cleaner look
     ax.margins(x=0.02, y=0.1)
     
-    # Tight layout
-    plt.tight_layout()
-    
-    # Save
-    output_path = os.path.join(config.GRAPH_DIR, f'{symbol}_price_history.png')
-    plt.savefig(output_path, dpi=config.GRAPH_DPI, bbox_inches='tight')
-    plt.close(fig)
-    
-    return output_path
+    # Encode (figure is kept open for the next render)
+    return _save_png(fig)
 
 
-async def generate_comparison_graph(symbols: List[str]) -> str:
+async def generate_comparison_graph(symbols: List[str]) -> io.BytesIO:
     """
     Generate a comparison graph for multiple stocks.
     
@@ -156,44 +289,73 @@ async def generate_comparison_graph(symbols: List[str]) -> str:
         symbols: List of stock symbols to compare
     
     Returns:
-        Path to the generated graph image
+        In-memory PNG image, ready to pass to discord.File
     """
-    _ensure_graph_dir()
-    
     if not symbols:
         raise ValueError("No symbols provided")
     
-    # Create figure
-    fig, ax = plt.subplots(figsize=(config.GRAPH_WIDTH, config.GRAPH_HEIGHT), dpi=config.GRAPH_DPI)
-    
-    colors = ['#5865F2', '#57F287', '#FEE75C', '#ED4245', '#EB459E', '#F26522']
+    # Fetch only the history keys first so a cache hit never copies any history
+    results = await asyncio.gather(
+        *(market.market.get_price_series_key(symbol) for symbol in symbols),
+        return_exceptions=True
+    )
     
-    for idx, symbol in enumerate(symbols):
-        stock_info = await market.market.get_stock_info(symbol)
-        if not stock_info:
+    plottable = []
+    for symbol, series_key in zip(symbols, results):
+        if isinstance(series_key, Exception):
+            logger.warning(f"Failed to load price history for {symbol}: {series_key}")
             continue
-        
-        history = stock_info['price_history']
-        if not history:
+        if series_key and series_key[0]:
+            plottable.append((symbol, series_key))
+    
+    # Reuse the last render if none of the compared stocks has a new tick
+    cached_png = _get_cached_graph(tuple((symbol,) + series_key for symbol, series_key in plottable))
+    if cached_png:
+        return io.BytesIO(cached_png)
+    
+    # Cache miss: now copy the histories to render
+    results = await asyncio.gather(
+        *(market.market.get_price_series(symbol) for symbol, _ in plottable),
+        return_exceptions=True
+    )
+    
+    price_series_list = []
+    for (symbol, _), price_series in zip(plottable, results):
+        if isinstance(price_series, Exception):
+            logger.warning(f"Failed to load price history for {symbol}: {price_series}")
             continue
-        
-        timestamps = []
-        prices = []
-        
-        for entry in history:
-            try:
-                timestamp = datetime.fromisoformat(entry['timestamp'])
-                price = entry['price'] / config.SPURS_PER_COG
-                timestamps.append(timestamp)
-                prices.append(price)
-            except (ValueError, KeyError) as e:
-                logger.warning(f"Invalid price history entry: {e}")
-                continue
-        
-        if timestamps:
-            team_name = team_detection.get_team_name(symbol)
-            color = colors[idx % len(colors)]
-            ax.plot(timestamps, prices, linewidth=2.5, label=f'{symbol} - {team_name}', color=color, alpha=0.9)
+        if price_series and price_series['timestamps']:
+            price_series_list.append((symbol, price_series))
+    
+    cache_key = tuple((symbol,) + price_series['key'] for symbol, price_series in price_series_list)
+    
+    # Collect (symbol, team_name, timestamps, prices) for each plottable stock
+    series = []
+    
+    for symbol, price_series in price_series_list:
+        timestamps = _to_plot_dates(price_series['timestamps'])
+        prices = np.asarray(price_series['prices'], dtype=np.float64) / config.SPURS_PER_COG
+        timestamps, prices = _downsample(timestamps, prices)
+        team_name = team_detection.get_team_name(symbol)
+        series.append((symbol, team_name, timestamps, prices))
+    
+    # Render in a worker process so the event loop stays responsive
+    png = await _render_in_pool(_render_comparison_graph, series)
+    _cache_graph(cache_key, png)
+    
+    return io.BytesIO(png)
+
+
+def _render_comparison_graph(series: List[tuple]) -> bytes:
+    """Render a stock comparison graph to PNG bytes (runs in the graph process pool)."""
+    # Reuse this worker's figure
+    fig, ax = _get_figure('comparison')
+    
+    colors = ['#5865F2', '#57F287', '#FEE75C', '#ED4245', '#EB459E', '#F26522']
+    
+    for idx, (symbol, team_name, timestamps, prices) in enumerate(series):
+        color = colors[idx % len(colors)]
+        ax.plot(timestamps, prices, linewidth=2.5, label=f'{symbol} - {team_name}', color=color, alpha=0.9)
     
     # Format
     ax.set_title('Stock Price Comparison', fontsize=16, fontweight='bold', color='white')
@@ -219,18 +381,11 @@ async def generate_comparison_graph(symbols: List[str]) -> str:
         spine.set_color('#2C2F33')
         spine.set_linewidth(1.5)
     
-    # Tight layout
-    plt.tight_layout()
-    
-    # Save
-    output_path = os.path.join(config.GRAPH_DIR, 'price_comparison.png')
-    plt.savefig(output_path, dpi=config.GRAPH_DPI, bbox_inches='tight')
-    plt.close(fig)
-    
-    return output_path
+    # Encode (figure is kept open for the next render)
+    return _save_png(fig)
 
 
-async def generate_portfolio_graph(user_id: int, history_data: List[Dict]) -> str:
+async def generate_portfolio_graph(user_id: int, history_data: List[Dict]) -> io.BytesIO:
     """
     Generate a portfolio value graph over time.
     
@@ -239,10 +394,8 @@ async def generate_portfolio_graph(user_id: int, history_data: List[Dict]) -> st
         history_data: List of dicts with 'timestamp' and 'total_value' keys
     
     Returns:
-        Path to the generated graph image
+        In-memory PNG image, ready to pass to discord.File
     """
-    _ensure_graph_dir()
-    
     if not history_data:
         raise ValueError("No portfolio history data")
     
@@ -262,8 +415,16 @@ async def generate_portfolio_graph(user_id: int, history_data: List[Dict]) -> st
     if not timestamps:
         raise ValueError("No valid portfolio history")
     
-    # Create figure
-    fig, ax = plt.subplots(figsize=(config.GRAPH_WIDTH, config.GRAPH_HEIGHT), dpi=config.GRAPH_DPI)
+    # Render in a worker process so the event loop stays responsive
+    png = await _render_in_pool(_render_portfolio_graph, timestamps, values)
+    
+    return io.BytesIO(png)
+
+
+def _render_portfolio_graph(timestamps: List[datetime], values: List[float]) -> bytes:
+    """Render a portfolio value graph to PNG bytes (runs in the graph process pool)."""
+    # Reuse this worker's figure
+    fig, ax = _get_figure('portfolio')
     
     # Plot data
     ax.plot(timestamps, values, linewidth=2, color='#57F287')
@@ -282,12 +443,5 @@ async def generate_portfolio_graph(user_id: int, history_data: List[Dict]) -> st
     # Grid
     ax.grid(True, alpha=0.3, linestyle='--')
     
-    # Tight layout
-    plt.tight_layout()
-    
-    # Save
-    output_path = os.path.join(config.GRAPH_DIR, f'portfolio_{user_id}.png')
-    plt.savefig(output_path, dpi=config.GRAPH_DPI, bbox_inches='tight')
-    plt.close(fig)
-    
-    return output_path
+    # Encode (figure is kept open for the next render)
+    return _save_png(fig)
@@ -86,10 +86,10 @@ class LiveGraphManager:
                 
                 # Generate new graph
                 try:
-                    graph_path = await graphing.generate_price_graph(live_graph.symbol)
+                    graph_image = await graphing.generate_price_graph(live_graph.symbol)
                     
                     # Update message with new graph
-                    file = discord.File(graph_path, filename=f'{live_graph.symbol}_graph.png')
+                    file = discord.File(graph_image, filename=f'{live_graph.symbol}_graph.png')
                     
                     embed = live_graph.message.embeds[0]
                     embed.description = f"Price history (Live • Updates every {update_interval}s)"
@@ -1,35 +1,127 @@
-"""Market data storage using JSON files."""
+"""Market data storage: in-memory stocks backed by MessagePack snapshots and a write-ahead log."""
 import os
-import json
-from typing import Dict, List, Optional
-from datetime import datetime
+import time
+import msgpack
+import orjson
+from typing import Dict, List, Optional, Set
+from datetime import datetime, timezone
+from collections import deque
+from itertools import islice
 import asyncio
-import aiofiles
+import numpy as np
 import config
 from logger import logger
 import validators
 
 
+def _replace_file(path: str, content: bytes):
+    """Atomically replace a file's contents (blocking; run in a worker thread)."""
+    # Write beside the target and swap it in, so a crash never leaves a truncated file.
+    # No fsync: like the WAL, this guards against process crashes rather than power loss.
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def _read_msgpack_file(path: str) -> Dict:
+    """Read and unpack a MessagePack file (blocking; run in a worker thread)."""
+    with open(path, 'rb') as f:
+        return msgpack.unpackb(f.read(), raw=False)
+
+
+def _write_msgpack_file(path: str, data: Dict):
+    """Pack and atomically replace a MessagePack file (blocking; run in a worker thread)."""
+    _replace_file(path, msgpack.packb(data, use_bin_type=True))
+
+
+def _quarantine_file(path: str) -> str:
+    """Move an unreadable file aside without overwriting earlier copies. Returns the new path."""
+    corrupt_path = path + '.corrupt'
+    if os.path.exists(corrupt_path):
+        corrupt_path = f"{path}.{int(time.time())}.corrupt"
+    os.rename(path, corrupt_path)
+    return corrupt_path
+
+
+def _read_json_file(path: str) -> Dict:
+    """Read and parse a JSON file (blocking; run in a worker thread)."""
+    with open(path, 'rb') as f:
+        return orjson.loads(f.read())
+
+
+def _to_epoch(timestamp) -> float:
+    """Convert a stored timestamp (epoch seconds or legacy naive-UTC ISO string) to epoch seconds."""
+    if isinstance(timestamp, str):
+        return datetime.fromisoformat(timestamp).replace(tzinfo=timezone.utc).timestamp()
+    return float(timestamp)
+
+
+def _history_columns(raw) -> Dict[str, deque]:
+    """
+    Build bounded timestamp/price columns from a stored price history.
+    
+    Accepts the columnar {"t": [...], "p": [...]} format, or migrates the old
+    list of {"timestamp": iso, "price": int} entries.
+    """
+    if isinstance(raw, dict):
+        timestamps = raw.get('t', [])
+        prices = raw.get('p', [])
+    else:
+        timestamps = []
+        prices = []
+        for entry in raw:
+            try:
+                timestamp = _to_epoch(entry['timestamp'])
+                price = entry['price']
+            except (ValueError, KeyError, TypeError) as e:
+                logger.warning(f"Skipping invalid price history entry: {e}")
+                continue
+            timestamps.append(timestamp)
+            prices.append(price)
+    
+    return {
+        't': deque(timestamps, maxlen=config.PRICE_HISTORY_MAX),
+        'p': deque(prices, maxlen=config.PRICE_HISTORY_MAX)
+    }
+
+
 class MarketData:
     """Manages stock prices and activity tracking."""
     
     def __init__(self):
         self.data_dir = config.MARKET_DATA_DIR
-        self.activity_scores = {symbol: 0 for symbol in config.TEAMS.keys()}
-        self._lock = asyncio.Lock()
-        # In-memory cache for frequently accessed stock data
-        self._cache = {}
-        self._cache_timestamps = {}
-        self._cache_ttl = 5.0  # Cache TTL in seconds
-    
-    def _get_stock_file(self, symbol: str) -> str:
-        """Get the file path for a stock's JSON file."""
+        # Activity scores live in one array so decay is a single vectorized multiply
+        self._symbols = list(config.TEAMS)
+        self._sym_idx = {symbol: i for i, symbol in enumerate(self._symbols)}
+        self._scores = np.zeros(len(self._symbols), dtype=np.float32)
+        self._lock = asyncio.Lock()  # Serializes flushes
+        # One lock per stock file so I/O on different stocks never waits on each other
+        self._locks: Dict[str, asyncio.Lock] = {symbol: asyncio.Lock() for symbol in config.TEAMS}
+        # In-memory source of truth for all stocks (loaded once in initialize)
+        self._stocks: Dict[str, Dict] = {}
+        # Append-only log of price updates since the last flush
+        self.wal_path = os.path.join(self.data_dir, 'market.wal')
+        self._wal = None
+        # Symbols changed since the last flush; each is written at most once per flush
+        self._dirty: Set[str] = set()
+        self._updates_since_flush = 0
+        self._flush_event = asyncio.Event()
+        self._flush_task: Optional[asyncio.Task] = None
+        # Stocks loaded from a legacy JSON file, removed once their MessagePack file is written
+        self._legacy_json: Set[str] = set()
+        # Read-only views shared by all callers until the next price change
+        self._all_prices_cache: Optional[Dict[str, int]] = None
+        self._all_stocks_cache: Optional[List[Dict]] = None
+    
+    def _get_stock_file(self, symbol: str, extension: str = '.msgpack') -> str:
+        """Get the file path for a stock's data file (or its legacy '.json' file)."""
         # Validate and sanitize symbol to prevent path traversal
         if not validators.validate_symbol(symbol):
             raise ValueError(f"Invalid symbol: {symbol}")
         
         sanitized_symbol = validators.sanitize_symbol(symbol)
-        filepath = os.path.join(self.data_dir, f"{sanitized_symbol}.json")
+        filepath = os.path.join(self.data_dir, f"{sanitized_symbol}{extension}")
         
         # Verify path is within data directory
         if not validators.validate_filepath(filepath, self.data_dir):
@@ -37,196 +129,396 @@ class MarketData:
         
         return filepath
     
-    def _is_cache_valid(self, symbol: str) -> bool:
-        """Check if cached data is still valid."""
-        if symbol not in self._cache:
-            return False
-        
-        import time
-        timestamp = self._cache_timestamps.get(symbol, 0)
-        return (time.time() - timestamp) < self._cache_ttl
-    
-    def _invalidate_cache(self, symbol: str):
-        """Invalidate cache for a specific symbol."""
-        self._cache.pop(symbol, None)
-        self._cache_timestamps.pop(symbol, None)
-    
     async def initialize(self):
-        """Set up data directory and create stock files."""
+        """Load all stocks into memory, replay the WAL and start the flusher task."""
         os.makedirs(self.data_dir, exist_ok=True)
         
-        for symbol, team in config.TEAMS.items():
-            stock_file = self._get_stock_file(symbol)
-            
-            if not os.path.exists(stock_file):
-                # Create new stock file
+        # Read every stock file concurrently so their disk waits overlap
+        loaded = await asyncio.gather(*(self._read_stock_data(symbol) for symbol in config.TEAMS))
+        
+        for (symbol, team), stock_data in zip(config.TEAMS.items(), loaded):
+            if stock_data is None:
+                # Create new stock
                 stock_data = {
                     'team_name': team['name'],
                     'symbol': symbol,
                     'starting_price': team['starting_price'],
                     'current_price': team['starting_price'],
                     'volatility': team['volatility'],
-                    'price_history': [
-                        {
-                            'timestamp': datetime.utcnow().isoformat(),
-                            'price': team['starting_price']
-                        }
-                    ]
+                    'price_history': {
+                        't': [time.time()],
+                        'p': [team['starting_price']]
+                    }
                 }
-                await self._write_stock_data(symbol, stock_data)
+            
+            # Share the config key object instead of keeping the parsed copy of the symbol
+            stock_data['symbol'] = symbol
+            
+            # Parallel bounded columns: appends are O(1) and never need a trim
+            stock_data['price_history'] = _history_columns(stock_data.get('price_history', []))
+            self._stocks[symbol] = stock_data
+        
+        # Recover updates that were logged after the last snapshot
+        self._replay_wal(self.wal_path + '.old')
+        self._replay_wal(self.wal_path)
+        
+        # Start from fully written stock files and an empty WAL
+        self._dirty.update(self._stocks)
+        await self.flush()
+        
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flusher())
+    
+    async def close(self):
+        """Stop the flusher task and write any remaining changes."""
+        if self._flush_task:
+            self._flush_task.cancel()
+            self._flush_task = None
+        
+        if self._dirty:
+            await self.flush()
+        
+        if self._wal:
+            self._wal.close()
+            self._wal = None
+    
+    def _replay_wal(self, wal_path: str):
+        """Apply WAL entries newer than each stock's last recorded history entry."""
+        if not os.path.exists(wal_path):
+            return
+        
+        replayed = 0
+        with open(wal_path, 'rb') as f:
+            for line in f:
+                try:
+                    entry = orjson.loads(line)
+                    symbol, timestamp, price = entry['s'], _to_epoch(entry['t']), entry['p']
+                except (orjson.JSONDecodeError, ValueError, KeyError, TypeError):
+                    # A torn final line from a crash mid-write
+                    logger.warning(f"Skipping invalid WAL entry: {line.strip()!r}")
+                    continue
+                
+                data = self._stocks.get(symbol)
+                if not data:
+                    continue
+                
+                timestamps = data['price_history']['t']
+                if timestamps and timestamp <= timestamps[-1]:
+                    continue  # Already in the stock file
+                
+                self._apply_price(data, timestamp, price)
+                self._dirty.add(symbol)
+                replayed += 1
+        
+        if replayed:
+            logger.info(f"Replayed {replayed} price updates from {wal_path}")
+    
+    def _apply_price(self, data: Dict, timestamp: float, price: int):
+        """Set the current price and append it to the in-memory history."""
+        data['current_price'] = price
+        self._all_prices_cache = None
+        self._all_stocks_cache = None
+        # The deques drop the oldest entry once PRICE_HISTORY_MAX is reached
+        history = data['price_history']
+        history['t'].append(timestamp)
+        history['p'].append(price)
+    
+    def _append_wal(self, symbol: str, timestamp: float, price: int):
+        """Append a single price update to the WAL."""
+        if self._wal is None:
+            self._wal = open(self.wal_path, 'ab')
+        
+        self._wal.write(orjson.dumps({'s': symbol, 't': timestamp, 'p': price}) + b'\n')
+        self._wal.flush()
+        
+        self._updates_since_flush += 1
+        if self._updates_since_flush >= config.MARKET_FLUSH_UPDATES:
+            self._flush_event.set()
+    
+    async def _flusher(self):
+        """Flush dirty stocks every MARKET_FLUSH_INTERVAL seconds, or sooner after a burst of updates."""
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_event.wait(), timeout=config.MARKET_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_event.clear()
+            
+            if not self._dirty:
+                continue
+            
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Failed to flush market data: {e}")
+    
+    def _rotate_wal(self):
+        """Move the current WAL aside so new updates start a fresh log."""
+        if self._wal:
+            self._wal.close()
+            self._wal = None
+        
+        if not os.path.exists(self.wal_path):
+            return
+        
+        old_path = self.wal_path + '.old'
+        if os.path.exists(old_path):
+            # A previous flush failed; keep its entries alongside the new ones
+            with open(self.wal_path, 'rb') as src, open(old_path, 'ab') as dst:
+                dst.write(src.read())
+            os.remove(self.wal_path)
+        else:
+            os.replace(self.wal_path, old_path)
+    
+    def _serializable_stock(self, symbol: str) -> Dict:
+        """Copy a stock with its history columns as plain lists."""
+        data = self._stocks[symbol]
+        history = data['price_history']
+        return {**data, 'price_history': {'t': list(history['t']), 'p': list(history['p'])}}
+    
+    async def flush(self):
+        """Write each dirty stock to its data file once and start a fresh WAL."""
+        async with self._lock:
+            # Rotate the WAL first so updates made while writing land in the new log
+            self._rotate_wal()
+            self._updates_since_flush = 0
+            
+            dirty = self._dirty
+            self._dirty = set()
+            
+            # Copy histories up front so the files match the rotation point
+            stocks = {symbol: self._serializable_stock(symbol) for symbol in dirty}
+            
+            # Write all dirty stocks concurrently in worker threads
+            results = await asyncio.gather(
+                *(self._write_stock_data(symbol, data) for symbol, data in stocks.items())
+            )
+            
+            failed = False
+            for symbol, ok in zip(stocks, results):
+                if not ok:
+                    self._dirty.add(symbol)
+                    failed = True
+            
+            # Keep the old WAL until every change it holds is on disk
+            if not failed and os.path.exists(self.wal_path + '.old'):
+                os.remove(self.wal_path + '.old')
+    
+    def _get_lock(self, symbol: str) -> asyncio.Lock:
+        """Get the lock guarding a stock's file."""
+        lock = self._locks.get(symbol)
+        if lock is None:
+            lock = self._locks[symbol] = asyncio.Lock()
+        return lock
     
     async def _read_stock_data(self, symbol: str) -> Optional[Dict]:
-        """Read stock data from JSON file with caching."""
-        # Check cache first
-        if self._is_cache_valid(symbol):
-            return self._cache[symbol].copy()
+        """
+        Read stock data from its MessagePack file, falling back to a legacy JSON file.
+        
+        Returns:
+            The stock data, or None if the stock has no file yet (or its file was
+            corrupt and has been moved aside to '<file>.corrupt').
         
+        Raises:
+            OSError: If an existing file can't be read or moved aside, so startup
+            fails instead of replacing the stock with fresh data.
+        """
         try:
             stock_file = self._get_stock_file(symbol)
+            json_file = self._get_stock_file(symbol, '.json')
         except ValueError as e:
             logger.error(f"Invalid symbol in _read_stock_data: {e}")
             return None
         
-        if not os.path.exists(stock_file):
-            return None
-        
-        try:
-            # Async file reading without holding lock during I/O
-            async with aiofiles.open(stock_file, 'r', encoding='utf-8') as f:
-                content = await f.read()
-                data = json.loads(content)
-            
-            # Update cache
-            import time
-            self._cache[symbol] = data
-            self._cache_timestamps[symbol] = time.time()
-            
-            return data.copy()
-        except json.JSONDecodeError as e:
-            logger.error(f"Corrupted JSON for {symbol}: {e}")
-            return None
-        except IOError as e:
-            logger.error(f"Failed to read {stock_file}: {e}")
-            return None
+        async with self._get_lock(symbol):
+            try:
+                try:
+                    data = await asyncio.to_thread(_read_msgpack_file, stock_file)
+                except FileNotFoundError:
+                    stock_file = json_file
+                    data = await asyncio.to_thread(_read_json_file, json_file)
+                    logger.info(f"Migrating {symbol} from JSON to MessagePack")
+                    self._legacy_json.add(symbol)
+                
+                if not isinstance(data, dict) or 'current_price' not in data:
+                    raise ValueError("not a stock record")
+                return data
+            except FileNotFoundError:
+                return None
+            except ValueError as e:
+                self._legacy_json.discard(symbol)
+                corrupt_file = await asyncio.to_thread(_quarantine_file, stock_file)
+                logger.error(f"Corrupted data for {symbol} ({e}); moved {stock_file} to {corrupt_file}")
+                return None
     
-    async def _write_stock_data(self, symbol: str, data: Dict):
-        """Write stock data to JSON file asynchronously."""
+    async def _write_stock_data(self, symbol: str, data: Dict) -> bool:
+        """Write stock data to its MessagePack file. Returns True on success."""
         try:
             stock_file = self._get_stock_file(symbol)
         except ValueError as e:
             logger.error(f"Invalid symbol in _write_stock_data: {e}")
-            return
+            return False
         
         try:
-            # Serialize JSON first (CPU-bound operation outside lock)
-            json_content = json.dumps(data, indent=2, ensure_ascii=False)
-            
-            # Lock only for write operation
-            async with self._lock:
-                async with aiofiles.open(stock_file, 'w', encoding='utf-8') as f:
-                    await f.write(json_content)
-            
-            # Invalidate cache after successful write
-            self._invalidate_cache(symbol)
-        except IOError as e:
+            async with self._get_lock(symbol):
+                await asyncio.to_thread(_write_msgpack_file, stock_file, data)
+                
+                # The MessagePack file now supersedes the migrated JSON file
+                if symbol in self._legacy_json:
+                    self._legacy_json.discard(symbol)
+                    os.remove(self._get_stock_file(symbol, '.json'))
+            return True
+        except (IOError, TypeError, ValueError) as e:
             logger.error(f"Failed to write {stock_file}: {e}")
+            return False
+    
+    async def export_json(self, symbol: str) -> Optional[bytes]:
+        """
+        Export a stock's current data as indented JSON for inspection (used by /exportstock).
+        
+        Returns:
+            UTF-8 JSON bytes, or None if the stock doesn't exist
+        """
+        if symbol not in self._stocks:
+            return None
+        
+        # Copy on the event loop, encode in a worker thread
+        data = self._serializable_stock(symbol)
+        return await asyncio.to_thread(orjson.dumps, data, option=orjson.OPT_INDENT_2)
     
     async def get_price(self, symbol: str) -> Optional[int]:
         """Get current price for a stock."""
-        data = await self._read_stock_data(symbol)
+        data = self._stocks.get(symbol)
         if data:
             return data['current_price']
         return None
     
     async def get_all_prices(self) -> Dict[str, int]:
-        """Get current prices for all stocks."""
-        prices = {}
-        for symbol in config.TEAMS.keys():
-            price = await self.get_price(symbol)
-            if price is not None:
-                prices[symbol] = price
-        return prices
+        """Get current prices for all stocks. The result is shared; don't mutate it."""
+        if self._all_prices_cache is None:
+            self._all_prices_cache = {symbol: data['current_price'] for symbol, data in self._stocks.items()}
+        return self._all_prices_cache
     
     async def get_stock_info(self, symbol: str) -> Optional[Dict]:
         """Get full stock information."""
-        return await self._read_stock_data(symbol)
+        data = self._stocks.get(symbol)
+        if data:
+            return data.copy()
+        return None
     
     async def get_all_stocks(self) -> List[Dict]:
-        """Get information for all stocks."""
-        stocks = []
-        for symbol in config.TEAMS.keys():
-            stock_data = await self._read_stock_data(symbol)
-            if stock_data:
-                stocks.append(stock_data)
-        return stocks
+        """Get information for all stocks. The result is shared; don't mutate it."""
+        if self._all_stocks_cache is None:
+            self._all_stocks_cache = [data.copy() for data in self._stocks.values()]
+        return self._all_stocks_cache
     
-    async def update_price(self, symbol: str, new_price: int):
-        """Update stock price and append to history."""
-        data = await self._read_stock_data(symbol)
+    def _record_price(self, symbol: str, new_price: int):
+        """Apply a price update in memory and log it to the WAL."""
+        data = self._stocks.get(symbol)
         if not data:
             return
         
-        data['current_price'] = new_price
+        timestamp = time.time()
         
-        # Append to history
-        data['price_history'].append({
-            'timestamp': datetime.utcnow().isoformat(),
-            'price': new_price
-        })
-        
-        # Trim history if too long
-        if len(data['price_history']) > config.PRICE_HISTORY_MAX:
-            data['price_history'] = data['price_history'][-config.PRICE_HISTORY_MAX:]
-        
-        await self._write_stock_data(symbol, data)
+        self._apply_price(data, timestamp, new_price)
+        self._dirty.add(symbol)
+        self._append_wal(symbol, timestamp, new_price)
+    
+    async def update_price(self, symbol: str, new_price: int):
+        """Update stock price and append to history."""
+        self._record_price(symbol, new_price)
     
     async def update_prices_batch(self, updates: Dict[str, int]):
         """Update multiple stock prices in batch for better performance."""
-        tasks = []
         for symbol, new_price in updates.items():
-            tasks.append(self.update_price(symbol, new_price))
-        await asyncio.gather(*tasks)
+            self._record_price(symbol, new_price)
     
     async def reset_prices(self):
         """Reset all stock prices to starting values."""
         for symbol, team in config.TEAMS.items():
-            data = await self._read_stock_data(symbol)
-            if data:
-                data['current_price'] = team['starting_price']
-                data['price_history'].append({
-                    'timestamp': datetime.utcnow().isoformat(),
-                    'price': team['starting_price']
-                })
-                await self._write_stock_data(symbol, data)
+            self._record_price(symbol, team['starting_price'])
     
     async def get_price_history(self, symbol: str, limit: Optional[int] = None) -> List[Dict]:
         """Get price history for a stock."""
-        data = await self._read_stock_data(symbol)
+        data = self._stocks.get(symbol)
         if not data:
             return []
         
-        history = data['price_history']
+        timestamps = data['price_history']['t']
+        prices = data['price_history']['p']
         if limit:
-            return history[-limit:]
-        return history
+            # Walk back from the newest entry instead of scanning the whole column
+            entries = list(islice(zip(reversed(timestamps), reversed(prices)), limit))
+            entries.reverse()
+        else:
+            entries = zip(timestamps, prices)
+        
+        return [
+            {'timestamp': datetime.fromtimestamp(t, timezone.utc).isoformat(), 'price': p}
+            for t, p in entries
+        ]
+    
+    @staticmethod
+    def _series_key(timestamps: deque) -> tuple:
+        """Identify a history by its length and last timestamp."""
+        return (len(timestamps), timestamps[-1] if timestamps else None)
+    
+    async def get_price_series_key(self, symbol: str) -> Optional[tuple]:
+        """
+        Get the key get_price_series would return, without copying the history.
+        
+        Returns:
+            (length, last timestamp) tuple, or None if the stock doesn't exist
+        """
+        data = self._stocks.get(symbol)
+        if not data:
+            return None
+        return self._series_key(data['price_history']['t'])
     
-    def increment_activity(self, symbol: str):
+    async def get_price_series(self, symbol: str) -> Optional[Dict]:
+        """
+        Get price history as parallel columns.
+        
+        Returns:
+            Dict with 'timestamps' (epoch seconds) and 'prices' (Spurs) lists
+            plus a 'key' that changes whenever a tick is added, or None if the
+            stock doesn't exist.
+        """
+        data = self._stocks.get(symbol)
+        if not data:
+            return None
+        
+        timestamps = data['price_history']['t']
+        return {
+            'timestamps': list(timestamps),
+            'prices': list(data['price_history']['p']),
+            'key': self._series_key(timestamps)
+        }
+    
+    def increment_activity(self, symbol: str, count: int = 1):
         """Increment activity score for a team."""
-        if symbol in self.activity_scores:
-            self.activity_scores[symbol] += 1
+        idx = self._sym_idx.get(symbol)
+        if idx is not None:
+            self._scores[idx] += count
     
-    def get_activity_score(self, symbol: str) -> int:
+    def get_activity_score(self, symbol: str) -> float:
         """Get activity score for a team."""
-        return self.activity_scores.get(symbol, 0)
+        idx = self._sym_idx.get(symbol)
+        if idx is None:
+            return 0
+        return float(self._scores[idx])
+    
+    def get_all_activity_scores(self) -> Dict[str, float]:
+        """Get a snapshot of activity scores for all teams."""
+        return dict(zip(self._symbols, self._scores.tolist()))
     
     def decay_activity(self):
         """Decay all activity scores."""
-        for symbol in self.activity_scores:
-            self.activity_scores[symbol] *= config.ACTIVITY_DECAY
+        self._scores *= config.ACTIVITY_DECAY
     
     def reset_activity(self):
         """Reset all activity scores to zero."""
-        self.activity_scores = {symbol: 0 for symbol in config.TEAMS.keys()}
+        self._scores.fill(0)
 
 
 # Global market data instance
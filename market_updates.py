@@ -1,6 +1,7 @@
 """Market updates broadcaster - sends periodic price updates to a channel."""
 import discord
 from discord.ext import tasks
+import time
 from datetime import datetime
 import market
 import team_detection
@@ -139,9 +140,9 @@ class MarketUpdatesBroadcaster:
                 price_str = utils.format_price(current_price)
                 
                 # Get recent high/low from history
-                history = stock.get('price_history', [])
+                history = await market.market.get_price_history(symbol, limit=10)
                 if len(history) >= 10:
-                    recent_prices = [h['price'] for h in history[-10:]]
+                    recent_prices = [h['price'] for h in history]
                     high_24h = max(recent_prices)
                     low_24h = min(recent_prices)
                     range_str = f"Range: {utils.format_price(low_24h)} - {utils.format_price(high_24h)}"
@@ -169,7 +170,7 @@ class MarketUpdatesBroadcaster:
                 summary_text += f"{move_emoji} **Biggest Mover:** {biggest_mover[0]} ({biggest_mover[1]:+.2f}%)\n"
             
             summary_text += f"📊 **Market Sentiment:** {movers_up} up, {movers_down} down\n"
-            summary_text += f"⏰ **Next Update:** <t:{int((datetime.utcnow().timestamp() + config.MARKET_UPDATES_INTERVAL))}:R>"
+            summary_text += f"⏰ **Next Update:** <t:{int(time.time() + config.MARKET_UPDATES_INTERVAL)}:R>"
             
             embed.add_field(
                 name="📈 Market Summary",
@@ -1,17 +1,63 @@
 """Team detection from roles and message tags."""
 import re
-from typing import Optional
-from functools import lru_cache
+from typing import Dict, Optional, Tuple
 import discord
 import config
 
 
+# Known tags in uppercase, as configured ('STMP' is written [STMP]; '[[L]]' must be written [[L]])
+_TAG_TO_SYMBOL = {tag.upper(): symbol for tag, symbol in config.TEAM_TAGS.items()}
+
+
+def _tag_regex(tag: str) -> str:
+    """Regex for one configured tag, keeping its bracket count ('STMP' -> [STMP], '[[L]]' -> [[L]])."""
+    inner = tag.strip('[]')
+    brackets = (len(tag) - len(tag.lstrip('['))) or 1
+    return rf'{re.escape("[" * brackets)}\s*{re.escape(inner)}\s*{re.escape("]" * brackets)}'
+
+
+def _build_tag_pattern() -> Tuple[re.Pattern, Dict[str, str]]:
+    """
+    Compile one alternation that only matches known [TAG]s.
+    
+    Each team's tags sit in one named group (g0, g1, ...), so a match's
+    lastgroup maps straight to the symbol with no per-match string work.
+    Generated names keep symbols that aren't valid identifiers (e.g. '4X') safe.
+    
+    Returns:
+        The compiled pattern and a group name → symbol map
+    """
+    tags_by_symbol = {}
+    for tag, symbol in _TAG_TO_SYMBOL.items():
+        tags_by_symbol.setdefault(symbol, []).append(tag)
+    
+    groups = []
+    group_to_symbol = {}
+    for i, (symbol, tags) in enumerate(tags_by_symbol.items()):
+        # Longest first so e.g. 'NEW HORIZON' is tried before shorter overlapping tags
+        tags.sort(key=len, reverse=True)
+        alternation = '|'.join(_tag_regex(tag) for tag in tags)
+        group_to_symbol[f'g{i}'] = symbol
+        groups.append(f'(?P<g{i}>{alternation})')
+    
+    return re.compile('|'.join(groups), re.IGNORECASE), group_to_symbol
+
+
 # Pre-compile regex pattern at module level for performance
-_TAG_PATTERN = re.compile(r'\[([^\]]+)\]')
+_TAG_PATTERN, _GROUP_TO_SYMBOL = _build_tag_pattern()
 
 # Build reverse lookup map for O(1) role name → symbol lookups
 _ROLE_TO_SYMBOL = {team['role_name']: symbol for symbol, team in config.TEAMS.items()}
 
+# Role ID → symbol, resolved from role names as guilds become available
+_ROLE_ID_TO_SYMBOL: Dict[int, str] = {}
+
+# All tradable symbols, for constant-time validation
+VALID_SYMBOLS = frozenset(config.TEAMS.keys())
+
+# Symbol → team name, so name lookups are a single dict get
+_NAME_BY_SYMBOL = {symbol: team['name'] for symbol, team in config.TEAMS.items()}
+
 
 def detect_team_from_message(message: discord.Message) -> Optional[str]:
     """Detect team from user roles or [TAG] in message content."""
@@ -30,15 +76,37 @@ def detect_team_from_message(message: discord.Message) -> Optional[str]:
     return None
 
 
+def register_guild_roles(guild: discord.Guild):
+    """Map a guild's team role IDs to their symbols."""
+    for role in guild.roles:
+        update_role(role)
+
+
+def update_role(role: discord.Role):
+    """Add, refresh or drop a single role's mapping after it is created or renamed."""
+    symbol = _ROLE_TO_SYMBOL.get(role.name)
+    if symbol:
+        _ROLE_ID_TO_SYMBOL[role.id] = symbol
+    else:
+        _ROLE_ID_TO_SYMBOL.pop(role.id, None)
+
+
+def remove_role(role: discord.Role):
+    """Forget a deleted role."""
+    _ROLE_ID_TO_SYMBOL.pop(role.id, None)
+
+
 def _detect_team_from_roles(member: discord.Member) -> Optional[str]:
     """Check if user has a team role."""
     if not isinstance(member, discord.Member):
         return None
     
-    # Use reverse lookup map for O(1) performance
-    for role in member.roles:
-        if role.name in _ROLE_TO_SYMBOL:
-            return _ROLE_TO_SYMBOL[role.name]
+    # Scan the member's raw role IDs; member.roles would build and sort Role objects
+    get = _ROLE_ID_TO_SYMBOL.get  # Bound once instead of a global lookup per role
+    for role_id in member._roles:
+        symbol = get(role_id)
+        if symbol is not None:
+            return symbol
     
     return None
 
@@ -51,50 +119,31 @@ def _detect_team_from_tags(content: str) -> Optional[str]:
     if not content:
         return None
     
-    # Find all potential tags using pre-compiled pattern
-    matches = _TAG_PATTERN.finditer(content)
+    # Most messages have no tag at all; skip the regex entirely
+    if '[' not in content:
+        return None
     
-    # Process tags in order of appearance
-    for match in matches:
-        tag = match.group(1).strip().upper()
-        
-        # Remove extra brackets from [[L]]
-        if tag.startswith('[') and tag.endswith(']'):
-            tag = tag[1:-1]
-        
-        # Check if this tag maps to a team (using cached lookup)
-        symbol = _get_team_symbol_from_tag(tag)
-        if symbol:
-            return symbol
+    # Single pass: the pattern only matches known tags, so the first match wins
+    match = _TAG_PATTERN.search(content)
+    if match:
+        return _GROUP_TO_SYMBOL[match.lastgroup]
     
     return None
 
 
-@lru_cache(maxsize=128)
-def _get_team_symbol_from_tag(tag: str) -> Optional[str]:
-    """Get team symbol from tag with LRU caching."""
-    return config.TEAM_TAGS.get(tag)
-
-
-@lru_cache(maxsize=32)
 def get_team_name(symbol: str) -> Optional[str]:
     """Get the full team name from symbol."""
-    team = config.TEAMS.get(symbol.upper())
-    if team:
-        return team['name']
-    return None
+    return _NAME_BY_SYMBOL.get(symbol.upper())
 
 
-@lru_cache(maxsize=32)
 def get_team_info(symbol: str) -> Optional[dict]:
     """Get full team configuration."""
     return config.TEAMS.get(symbol.upper())
 
 
-@lru_cache(maxsize=64)
 def validate_symbol(symbol: str) -> bool:
-    """Check if a symbol is valid."""
-    return symbol.upper() in config.TEAMS
+    """Check if a normalized (uppercase) symbol is valid."""
+    return symbol in VALID_SYMBOLS
 
 
 def normalize_symbol(symbol: str) -> str: